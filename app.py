@@ -1,13 +1,19 @@
 import streamlit as st
 import pandas as pd
-import requests
+import asyncio
+import aiohttp
+import time
+import random
 from bs4 import BeautifulSoup
+from bs4.filter import ElementFilter
 import re
-import time
+try:
+    import orjson as _json  # C JSON parser, 2-5x faster than stdlib
+except ImportError:
+    import json as _json
 from urllib.parse import quote
 import io
 from datetime import datetime
-import base64
 
 # Configure page
 st.set_page_config(
@@ -52,46 +58,146 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Request headers sent with every page fetch
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'br, gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+# Politeness floor: each of the four fetch slots issues at most one request
+# per interval, so the aggregate request rate stays well-mannered without
+# idling slots whose requests already took longer than the interval
+_REQUEST_INTERVAL = 0.25
+
+# The scraped fields, in extraction order
+_FIELD_KEYS = ('address', 'asking_price', 'area_m2', 'energy_label')
+
+# Collapses address whitespace in a single pass instead of chained replaces
+_WS_TRANSLATION = str.maketrans({'\n': ' ', '\r': ' ', '\t': ' '})
+
+def _quote_address(address: str) -> str:
+    """Whitespace-normalize and percent-encode an address for a Maps URL"""
+    return quote(address.translate(_WS_TRANSLATION).strip())
+
+# Patterns compiled once at import time and reused for every URL
+_TITLE_ADDR_RE = re.compile(r'^([^-]+)')
+_ADDR_PATTERNS = [
+    re.compile(r'([A-Za-z\s]+\s+\d+[A-Za-z]?[,\s]+\d{4}\s*[A-Z]{2}[,\s]+[A-Za-z\s]+)'),
+    re.compile(r'([A-Za-z\s]+\s+\d+[A-Za-z]?[,\s\n]+[A-Za-z\s]+)')
+]
+# Matches "€ 395.000" plus an optional "k.k."/"kk"/"kosten koper"/"vk" suffix in one pass
+_PRICE_COMBINED = re.compile(
+    r'€\s*(?P<amt>\d{2,3}(?:\.\d{3})+)\s*(?P<suf>k\.k\.|kk|kosten koper|vk)?',
+    re.IGNORECASE,
+)
+_OBJECT_CLASS_RE = re.compile('object')
+# Address lookups in priority order; find() avoids soupsieve's per-call CSS parsing
+_ADDRESS_LOOKUPS = (
+    lambda soup: soup.find('h1'),
+    lambda soup: soup.find(attrs={'data-test-id': 'street-name-house-number'}),
+    lambda soup: soup.find(class_='object-header__title'),
+    lambda soup: soup.find(class_='fd-color-dark-1'),
+    lambda soup: soup.find('h1', class_=_OBJECT_CLASS_RE),
+    lambda soup: soup.find(class_='object-address'),
+)
+_AREA_DD_RE = re.compile(r'(\d+(?:[,\.]\d+)?)\s*m[²2]?')
+_AREA_TEXT_RE = re.compile(r'(\d+(?:[,\.]\d+)?)\s*m[²2]')
+_ENERGY_DD_RE = re.compile(r'([A-G])')
+_ENERGY_TEXT_RE = re.compile(r'[Ee]nergielabel[:\s]*([A-G])')
+_NON_DIGIT_RE = re.compile(r'[^\d]')
+_HEADER_CLASS_RE = re.compile('object-header|listing-header')
+_FEATURES_CLASS_RE = re.compile('features|specs')
+
+# Everything the extractor queries; any other markup is dropped at parse time
+_PARSE_TAGS = frozenset({'h1', 'title', 'header', 'dl', 'dt', 'dd'})
+_KEEP_CLASS_RE = re.compile('object-header|listing-header|object-address|fd-color-dark-1|features|specs')
+
+class _ListingFilter(ElementFilter):
+    """Parse-time filter keeping only the nodes extract_property_data looks at.
+
+    Funda pages carry a lot of inline JS, navigation and footer markup; skipping
+    those nodes during parsing shrinks both the tree and the fallback page text.
+    """
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        if name in _PARSE_TAGS:
+            return True
+        values = attrs or {}
+        if name == 'script':
+            return (values.get('type') == 'application/ld+json'
+                    or values.get('id') == '__NEXT_DATA__')
+        if values.get('data-test-id') == 'street-name-house-number':
+            return True
+        class_attr = values.get('class') or ''
+        if not isinstance(class_attr, str):
+            class_attr = ' '.join(class_attr)
+        return _KEEP_CLASS_RE.search(class_attr) is not None
+
+    def allow_string_creation(self, string):
+        # Top-level strings belong to dropped tags; text inside kept tags
+        # is added unconditionally and never reaches this check
+        return False
+
+_LISTING_FILTER = _ListingFilter()
+
 class OnlineFundaScraper:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-        })
-    
-    def extract_property_data(self, url: str) -> dict:
-        """Extract property data from Funda URL using requests/BeautifulSoup"""
+    async def _fetch_html(self, session, semaphore, url: str) -> bytes:
+        """Fetch one property page, rate-limited by the shared semaphore"""
+        async with semaphore:
+            start = time.monotonic()
+            timeout = aiohttp.ClientTimeout(total=10)
+            async with session.get(url, timeout=timeout) as response:
+                response.raise_for_status()
+                content = await response.read()
+            # Be respectful to the server, but only sleep for whatever is
+            # left of the interval after the request itself; a little jitter
+            # keeps the slots from firing in lockstep
+            elapsed = time.monotonic() - start
+            await asyncio.sleep(max(0.0, _REQUEST_INTERVAL - elapsed) + random.uniform(0, 0.25))
+        return content
+
+    async def scrape_urls(self, urls: list, progress_callback=None, debug: bool = False) -> list:
+        """Fetch all URLs concurrently and parse each page as it arrives"""
+        results = [None] * len(urls)
+        semaphore = asyncio.Semaphore(4)
+        connector = aiohttp.TCPConnector(limit=8)
+        loop = asyncio.get_running_loop()
+
+        async with aiohttp.ClientSession(headers=REQUEST_HEADERS, connector=connector) as session:
+            async def process(i, url):
+                try:
+                    content = await self._fetch_html(session, semaphore, url)
+                    # Parse in the default executor so a slow page doesn't
+                    # stall the other in-flight fetches
+                    results[i] = await loop.run_in_executor(
+                        None, self.extract_property_data, url, content, debug
+                    )
+                except Exception as e:
+                    results[i] = {
+                        'address': None,
+                        'link': url,
+                        'asking_price': None,
+                        'area_m2': None,
+                        'energy_label': None,
+                        'status': f'Error: {str(e)}'
+                    }
+
+            tasks = [asyncio.ensure_future(process(i, url)) for i, url in enumerate(urls)]
+            for done_count, task in enumerate(asyncio.as_completed(tasks), start=1):
+                await task
+                if progress_callback:
+                    progress_callback(done_count, len(urls))
+
+        return results
+
+    def extract_property_data(self, url: str, content: bytes, debug: bool = False) -> dict:
+        """Extract property data from fetched Funda page HTML using BeautifulSoup"""
         try:
-            # Debug: Show what we found
-            if data['address']:
-                st.success(f"✅ Found address: {data['address']}")
-            else:
-                st.warning("⚠️ Could not extract address")
-                
-            if data['asking_price']:
-                st.success(f"✅ Found price: {data['asking_price']}")
-            else:
-                st.warning("⚠️ Could not extract price")
-                
-            if data['area_m2']:
-                st.success(f"✅ Found area: {data['area_m2']} m²")
-            else:
-                st.warning("⚠️ Could not extract area")
-                
-            if data['energy_label']:
-                st.success(f"✅ Found energy label: {data['energy_label']}")
-            else:
-                st.warning("⚠️ Could not extract energy label")
-            
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
+            soup = BeautifulSoup(content, 'lxml', parse_only=_LISTING_FILTER)
+
             data = {
                 'address': None,
                 'link': url,
@@ -100,29 +206,32 @@ class OnlineFundaScraper:
                 'energy_label': None,
                 'status': 'Success'
             }
-            
+
+            # Method 0: structured data (JSON-LD, then Next.js __NEXT_DATA__) —
+            # authoritative and far cheaper than scanning the rendered page
+            self._extract_from_json_ld(soup, data)
+            if not all(data[key] for key in _FIELD_KEYS):
+                self._extract_from_next_data(soup, data)
+            if not debug and all(data[key] for key in _FIELD_KEYS):
+                return data
+
+            # Serialize the document text once; every fallback scan reuses it
+            page_text = soup.get_text(" ", strip=True)
+
             # Extract address with multiple methods
-            # Method 1: Try common selectors
-            address_selectors = [
-                'h1',
-                '[data-test-id="street-name-house-number"]', 
-                '.object-header__title',
-                '.fd-color-dark-1',
-                'h1[class*="object"]',
-                '.object-address'
-            ]
-            
-            for selector in address_selectors:
-                try:
-                    element = soup.select_one(selector)
-                    if element and element.get_text(strip=True):
-                        address_text = element.get_text(strip=True)
-                        # Filter out non-address text
-                        if len(address_text) > 10 and any(char.isdigit() for char in address_text):
-                            data['address'] = address_text
-                            break
-                except:
-                    continue
+            # Method 1: Try common locations in the markup
+            if not data['address']:
+                for lookup in _ADDRESS_LOOKUPS:
+                    try:
+                        element = lookup(soup)
+                        if element and element.get_text(strip=True):
+                            address_text = element.get_text(strip=True)
+                            # Filter out non-address text
+                            if len(address_text) > 10 and any(char.isdigit() for char in address_text):
+                                data['address'] = address_text
+                                break
+                    except:
+                        continue
             
             # Method 2: Extract from page title if not found
             if not data['address']:
@@ -131,7 +240,7 @@ class OnlineFundaScraper:
                     if title:
                         title_text = title.get_text()
                         # Extract address from title like "Wageningseberg 4, 3524 LR Utrecht - Funda"
-                        address_match = re.search(r'^([^-]+)', title_text)
+                        address_match = _TITLE_ADDR_RE.search(title_text)
                         if address_match:
                             potential_address = address_match.group(1).strip()
                             if len(potential_address) > 10:
@@ -143,15 +252,9 @@ class OnlineFundaScraper:
             if not data['address']:
                 try:
                     # Look for address patterns in all text
-                    page_text = soup.get_text()
                     # Pattern for Dutch addresses: Street + number + postal code + city
-                    address_patterns = [
-                        r'([A-Za-z\s]+\s+\d+[A-Za-z]?[,\s]+\d{4}\s*[A-Z]{2}[,\s]+[A-Za-z\s]+)',
-                        r'([A-Za-z\s]+\s+\d+[A-Za-z]?[,\s\n]+[A-Za-z\s]+)'
-                    ]
-                    
-                    for pattern in address_patterns:
-                        matches = re.findall(pattern, page_text)
+                    for pattern in _ADDR_PATTERNS:
+                        matches = pattern.findall(page_text)
                         for match in matches:
                             if len(match) > 15 and len(match) < 100:  # Reasonable address length
                                 data['address'] = match.strip()
@@ -161,111 +264,91 @@ class OnlineFundaScraper:
                 except:
                     pass
             
-            # Extract price with improved method
-            # Method 1: Look for span elements with € and numbers
-            price_found = False
-            try:
-                # Find all text containing € and .000
-                all_text = soup.get_text()
-                price_patterns = [
-                    r'€\s*(\d{2,3}(?:\.\d{3})+)\s*k\.k\.',  # € 395.000 k.k.
-                    r'€\s*(\d{2,3}(?:\.\d{3})+)\s*kk',      # € 395.000 kk
-                    r'€\s*(\d{2,3}(?:\.\d{3})+)\s*kosten koper',  # € 395.000 kosten koper
-                    r'€\s*(\d{2,3}(?:\.\d{3})+)\s*vk',      # € 395.000 vk
-                    r'€\s*(\d{2,3}(?:\.\d{3})+)',           # € 395.000 (fallback)
-                ]
-                
-                for pattern in price_patterns:
-                    matches = re.findall(pattern, all_text, re.IGNORECASE)
-                    if matches:
-                        # Check if it's not monthly rent
-                        context_start = max(0, all_text.find(f"€ {matches[0]}") - 50)
-                        context_end = min(len(all_text), all_text.find(f"€ {matches[0]}") + 100)
-                        context = all_text[context_start:context_end].lower()
-                        
-                        if 'per maand' not in context and 'maandlasten' not in context:
-                            if 'k.k.' in pattern or 'kk' in pattern or 'kosten koper' in pattern:
-                                data['asking_price'] = f"€ {matches[0]} k.k."
-                            elif 'vk' in pattern:
-                                data['asking_price'] = f"€ {matches[0]} vk"
-                            else:
-                                data['asking_price'] = f"€ {matches[0]}"
-                            price_found = True
-                            break
-            except:
-                pass
-            
-            # Method 2: Look in structured data (JSON-LD)
-            if not price_found:
+            # Extract price from the page text if JSON-LD did not have it;
+            # try the listing header region before scanning the whole page
+            if not data['asking_price']:
                 try:
-                    scripts = soup.find_all('script', type='application/ld+json')
-                    for script in scripts:
-                        try:
-                            import json
-                            data_json = json.loads(script.string)
-                            if isinstance(data_json, dict) and 'offers' in data_json:
-                                price = data_json['offers'].get('price')
-                                if price:
-                                    data['asking_price'] = f"€ {price:,.0f}".replace(',', '.')
-                                    price_found = True
-                                    break
-                        except:
-                            continue
+                    header = soup.find('header') or soup.find(class_=_HEADER_CLASS_RE)
+                    if header:
+                        data['asking_price'] = self._find_price(header.get_text(' ', strip=True))
+                    if not data['asking_price']:
+                        data['asking_price'] = self._find_price(page_text)
                 except:
                     pass
-            
+
+            # The characteristics live in the features <dl>; scan that region
+            # first and only fall back to the full page text when it misses
+            features = soup.find('dl') or soup.find(class_=_FEATURES_CLASS_RE)
+            if features is not None:
+                text_regions = (features.get_text(' ', strip=True), page_text)
+            else:
+                text_regions = (page_text,)
+
             # Enhanced area extraction
             # Method 1: Look in dt/dd pairs
-            dt_elements = soup.find_all('dt')
-            for dt in dt_elements:
-                try:
-                    dt_text = dt.get_text(strip=True).lower()
-                    if any(keyword in dt_text for keyword in ['woonoppervlakte', 'oppervlakte', 'gebruiksoppervlakte']):
-                        dd = dt.find_next_sibling('dd')
-                        if dd:
-                            dd_text = dd.get_text(strip=True)
-                            area_match = re.search(r'(\d+(?:[,\.]\d+)?)\s*m[²2]?', dd_text)
-                            if area_match:
-                                data['area_m2'] = area_match.group(1).replace(',', '.')
-                                break
-                    
-                    elif 'energielabel' in dt_text or 'energie' in dt_text:
-                        dd = dt.find_next_sibling('dd')
-                        if dd:
-                            dd_text = dd.get_text(strip=True)
-                            energy_match = re.search(r'([A-G])', dd_text)
-                            if energy_match:
-                                data['energy_label'] = energy_match.group(1)
-                except:
-                    continue
+            if not data['area_m2'] or not data['energy_label']:
+                dt_elements = soup.find_all('dt')
+                for dt in dt_elements:
+                    try:
+                        dt_text = dt.get_text(strip=True).lower()
+                        if not data['area_m2'] and any(keyword in dt_text for keyword in ['woonoppervlakte', 'oppervlakte', 'gebruiksoppervlakte']):
+                            dd = dt.find_next_sibling('dd')
+                            if dd:
+                                dd_text = dd.get_text(strip=True)
+                                area_match = _AREA_DD_RE.search(dd_text)
+                                if area_match:
+                                    data['area_m2'] = area_match.group(1).replace(',', '.')
+
+                        elif not data['energy_label'] and ('energielabel' in dt_text or 'energie' in dt_text):
+                            dd = dt.find_next_sibling('dd')
+                            if dd:
+                                dd_text = dd.get_text(strip=True)
+                                energy_match = _ENERGY_DD_RE.search(dd_text)
+                                if energy_match:
+                                    data['energy_label'] = energy_match.group(1)
+
+                        if data['area_m2'] and data['energy_label']:
+                            break
+                    except:
+                        continue
             
-            # Method 2: Look for area in all text if not found
+            # Method 2: Look for area in the scoped text if not found
             if not data['area_m2']:
                 try:
-                    all_text = soup.get_text()
-                    # Look for patterns like "71 m²" or "71m2"
-                    area_matches = re.findall(r'(\d+(?:[,\.]\d+)?)\s*m[²2]', all_text)
-                    for match in area_matches:
-                        area_value = float(match.replace(',', '.'))
-                        if 10 <= area_value <= 1000:  # Reasonable house size
-                            data['area_m2'] = match.replace(',', '.')
+                    for region in text_regions:
+                        # Look for patterns like "71 m²" or "71m2"
+                        for match in _AREA_TEXT_RE.findall(region):
+                            area_value = float(match.replace(',', '.'))
+                            if 10 <= area_value <= 1000:  # Reasonable house size
+                                data['area_m2'] = match.replace(',', '.')
+                                break
+                        if data['area_m2']:
                             break
                 except:
                     pass
-            
-            # Method 3: Look for energy label in all text if not found
+
+            # Method 3: Look for energy label in the scoped text if not found
             if not data['energy_label']:
                 try:
-                    all_text = soup.get_text()
-                    # Look for "Energielabel A" or similar
-                    energy_matches = re.findall(r'[Ee]nergielabel[:\s]*([A-G])', all_text)
-                    if energy_matches:
-                        data['energy_label'] = energy_matches[0].upper()
+                    for region in text_regions:
+                        # Look for "Energielabel A" or similar
+                        energy_matches = _ENERGY_TEXT_RE.findall(region)
+                        if energy_matches:
+                            data['energy_label'] = energy_matches[0].upper()
+                            break
                 except:
                     pass
-            
+
+            if debug:
+                title = soup.find('title')
+                data['_debug'] = {
+                    'title': title.get_text() if title else None,
+                    'h1_elements': [h1.get_text(strip=True) for h1 in soup.find_all('h1')[:3]],
+                    'text_snippet': page_text[:2000],
+                }
+
             return data
-            
+
         except Exception as e:
             return {
                 'address': None,
@@ -276,21 +359,136 @@ class OnlineFundaScraper:
                 'status': f'Error: {str(e)}'
             }
     
-    def get_commute_time_url(self, home_address: str, work_address: str) -> str:
-        """Generate Google Maps URL for commute checking"""
-        home_clean = home_address.replace('\n', ' ').strip()
-        work_clean = work_address.replace('\n', ' ').strip()
-        return f"https://www.google.com/maps/dir/{quote(home_clean)}/{quote(work_clean)}/data=!3m1!4b1!4m2!4m1!3e3"
-
-def create_download_link(df, filename):
-    """Create a download link for the DataFrame"""
+    def _extract_from_json_ld(self, soup, data: dict) -> None:
+        """Fill missing fields in data from the page's JSON-LD blocks, if any"""
+        for script in soup.find_all('script', type='application/ld+json'):
+            try:
+                # str() matters: orjson rejects bs4's NavigableString subclass
+                payload = _json.loads(str(script.string or script.get_text()))
+            except (TypeError, ValueError):
+                continue
+
+            nodes = payload if isinstance(payload, list) else [payload]
+            for node in nodes:
+                if not isinstance(node, dict):
+                    continue
+
+                if not data['address'] and isinstance(node.get('address'), dict):
+                    address = node['address']
+                    parts = [address.get('streetAddress'), address.get('postalCode'), address.get('addressLocality')]
+                    address_text = ' '.join(part for part in parts if part)
+                    if address_text:
+                        data['address'] = address_text
+
+                if not data['asking_price'] and isinstance(node.get('offers'), dict):
+                    price = node['offers'].get('price')
+                    if price:
+                        try:
+                            data['asking_price'] = f"€ {float(price):,.0f}".replace(',', '.')
+                        except (TypeError, ValueError):
+                            pass
+
+                if not data['area_m2'] and isinstance(node.get('floorSize'), dict):
+                    value = node['floorSize'].get('value')
+                    if value:
+                        data['area_m2'] = str(value).replace(',', '.')
+
+                if not data['energy_label']:
+                    label = node.get('energyEfficiencyRating') or node.get('energyLabel')
+                    if isinstance(label, str) and label[:1].upper() in 'ABCDEFG':
+                        data['energy_label'] = label[:1].upper()
+
+    def _extract_from_next_data(self, soup, data: dict) -> None:
+        """Fill missing fields in data from the Next.js __NEXT_DATA__ payload, if any"""
+        tag = soup.find('script', id='__NEXT_DATA__')
+        if tag is None or not tag.string:
+            return
+        try:
+            # str() matters: orjson rejects bs4's NavigableString subclass
+            payload = _json.loads(str(tag.string))
+        except (TypeError, ValueError):
+            return
+        if not isinstance(payload, dict):
+            return
+
+        listing = payload.get('props', {}).get('pageProps', {}).get('listing')
+        if not isinstance(listing, dict):
+            return
+
+        if not data['address'] and isinstance(listing.get('address'), dict):
+            address = listing['address']
+            parts = [address.get('streetName'), address.get('houseNumber'),
+                     address.get('postalCode'), address.get('city')]
+            address_text = ' '.join(str(part) for part in parts if part)
+            if address_text:
+                data['address'] = address_text
+
+        if not data['asking_price'] and isinstance(listing.get('price'), dict):
+            amount = listing['price'].get('askingPrice') or listing['price'].get('amount')
+            if amount:
+                try:
+                    data['asking_price'] = f"€ {float(amount):,.0f}".replace(',', '.')
+                except (TypeError, ValueError):
+                    pass
+
+        if not data['area_m2']:
+            area = listing.get('floorArea') or listing.get('livingArea')
+            if isinstance(area, dict):
+                area = area.get('value')
+            if area:
+                data['area_m2'] = str(area).replace(',', '.')
+
+        if not data['energy_label']:
+            label = listing.get('energyLabel')
+            if isinstance(label, dict):
+                label = label.get('label') or label.get('value')
+            if isinstance(label, str) and label[:1].upper() in 'ABCDEFG':
+                data['energy_label'] = label[:1].upper()
+
+    @staticmethod
+    def _find_price(text: str):
+        """Return the first sale price found in text, skipping monthly amounts"""
+        for m in _PRICE_COMBINED.finditer(text):
+            # Check if it's not monthly rent
+            context_start = max(0, m.start() - 50)
+            context_end = min(len(text), m.end() + 100)
+            context = text[context_start:context_end].lower()
+
+            if 'per maand' in context or 'maandlasten' in context:
+                continue
+
+            suffix = (m.group('suf') or '').lower()
+            if suffix in ('k.k.', 'kk', 'kosten koper'):
+                return f"€ {m.group('amt')} k.k."
+            if suffix == 'vk':
+                return f"€ {m.group('amt')} vk"
+            return f"€ {m.group('amt')}"
+        return None
+
+    def get_commute_time_url(self, home_address: str, work_quoted: str) -> str:
+        """Generate Google Maps URL for commute checking; work address comes pre-quoted"""
+        return f"https://www.google.com/maps/dir/{_quote_address(home_address)}/{work_quoted}/data=!3m1!4b1!4m2!4m1!3e3"
+
+def remove_selected_urls():
+    """Drop the URLs ticked in the removal form; runs once per submit"""
+    kept = []
+    for i, url in enumerate(st.session_state.urls_list):
+        if not st.session_state.get(f"remove_{i}", False):
+            kept.append(url)
+        st.session_state[f"remove_{i}"] = False
+    st.session_state.urls_list = kept
+
+def create_excel_bytes(df):
+    """Serialize the DataFrame to an in-memory Excel workbook"""
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+    # strings_to_urls skips xlsxwriter's per-cell URL detection, which
+    # otherwise dominates on the commute columns. constant_memory is off:
+    # it drops cells written out of row order, and to_excel writes by column
+    with pd.ExcelWriter(output, engine='xlsxwriter',
+                        engine_kwargs={'options': {'strings_to_urls': False}}) as writer:
         df.to_excel(writer, sheet_name='Properties', index=False)
-    
-    b64 = base64.b64encode(output.getvalue()).decode()
-    href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="{filename}">📥 Download Excel File</a>'
-    return href
+
+    return output.getvalue()
 
 def main():
     # Header
@@ -325,10 +523,16 @@ def main():
         col1, col2 = st.columns(2)
         with col1:
             if st.button("➕ Add URL"):
-                if url_input.strip() and "funda.nl" in url_input:
-                    st.session_state.urls_list.append(url_input.strip())
-                    st.success("URL added!")
-                elif url_input.strip():
+                # Normalize: drop query params and trailing slash so the same
+                # listing can't be added (and fetched) twice
+                url_clean = url_input.strip().split('?')[0].rstrip('/')
+                if url_clean and "funda.nl" in url_clean:
+                    if url_clean in st.session_state.urls_list:
+                        st.info("URL already added")
+                    else:
+                        st.session_state.urls_list.append(url_clean)
+                        st.success("URL added!")
+                elif url_clean:
                     st.error("Please enter a valid Funda URL")
         
         with col2:
@@ -336,17 +540,14 @@ def main():
                 st.session_state.urls_list = []
                 st.success("URLs cleared!")
         
-        # Display current URLs
+        # Display current URLs; removal goes through one form so ticking
+        # checkboxes doesn't rerun the script until submit
         if st.session_state.urls_list:
             st.write("**Added URLs:**")
-            for i, url in enumerate(st.session_state.urls_list):
-                col1, col2 = st.columns([4, 1])
-                with col1:
-                    st.text(f"{i+1}. {url[:50]}...")
-                with col2:
-                    if st.button("❌", key=f"remove_{i}"):
-                        st.session_state.urls_list.pop(i)
-                        st.rerun()
+            with st.form("url_management", clear_on_submit=False):
+                for i, url in enumerate(st.session_state.urls_list):
+                    st.checkbox(f"{i+1}. {url[:50]}...", key=f"remove_{i}")
+                st.form_submit_button("🗑️ Remove selected", on_click=remove_selected_urls)
         
         st.divider()
         
@@ -369,6 +570,7 @@ def main():
     col1, col2 = st.columns([2, 1])
     
     with col1:
+        force_refresh = st.checkbox("🔄 Force refresh (ignore cached results)")
         if st.button("🚀 Scrape Properties", type="primary", use_container_width=True):
             if not st.session_state.urls_list:
                 st.error("❌ Please add at least one Funda URL")
@@ -382,76 +584,112 @@ def main():
                 progress_bar = st.progress(0)
                 status_text = st.empty()
                 
+                def update_progress(done, total):
+                    progress_bar.progress(done / total)
+                    status_text.text(f"Scraping property {done}/{total}")
+
+                # Per-URL memoization: only URLs without a cached result hit the
+                # network; re-scraping after editing work addresses is then free
+                if 'scrape_cache' not in st.session_state:
+                    st.session_state.scrape_cache = {}
+                cache = {} if force_refresh else st.session_state.scrape_cache
+
+                # Deduplicate while preserving order, in case older sessions
+                # still carry duplicate entries
+                urls = list(dict.fromkeys(st.session_state.urls_list))
+                to_scrape = [u for u in urls if u not in cache]
+
+                # Fetch the uncached URLs concurrently; parsing happens as each arrives
+                if to_scrape:
+                    fresh_by_url = dict(zip(to_scrape, asyncio.run(
+                        scraper.scrape_urls(
+                            to_scrape,
+                            update_progress,
+                            debug=st.session_state.get('debug_mode', False),
+                        )
+                    )))
+                else:
+                    fresh_by_url = {}
+
                 properties_data = []
-                
-                for i, url in enumerate(st.session_state.urls_list):
-                    progress = (i + 1) / len(st.session_state.urls_list)
-                    progress_bar.progress(progress)
-                    status_text.text(f"Scraping property {i+1}/{len(st.session_state.urls_list)}")
-                    
-                    # Scrape property data
-                    property_data = scraper.extract_property_data(url)
-                    
-                    # Debug mode: show raw HTML snippet
-                    if st.session_state.get('debug_mode', False):
-                        with st.expander(f"🐛 Debug info for {property_data.get('address', 'Unknown')}"):
-                            try:
-                                response = scraper.session.get(url, timeout=10)
-                                soup = BeautifulSoup(response.content, 'html.parser')
-                                
-                                # Show page title
-                                title = soup.find('title')
-                                if title:
-                                    st.write(f"**Page Title:** {title.get_text()}")
-                                
-                                # Show first few h1 elements
-                                h1_elements = soup.find_all('h1')[:3]
-                                if h1_elements:
-                                    st.write("**H1 elements found:**")
-                                    for i, h1 in enumerate(h1_elements):
-                                        st.write(f"{i+1}. {h1.get_text(strip=True)}")
-                                
-                                # Show some text containing € or address patterns
-                                text_snippet = soup.get_text()[:2000]
-                                st.text_area("Raw text (first 2000 chars):", text_snippet, height=200)
-                                
-                            except Exception as e:
-                                st.error(f"Debug error: {e}")
-                    
+                for url in urls:
+                    if url in fresh_by_url:
+                        if fresh_by_url[url]['status'] == 'Success':
+                            st.session_state.scrape_cache[url] = fresh_by_url[url]
+                        # hand out copies so later mutation stays off the cache
+                        properties_data.append(dict(fresh_by_url[url]))
+                    else:
+                        properties_data.append(dict(cache[url]))
+
+                # Decide the commute handling once, not per row: flags and
+                # pre-quoted addresses are computed a single time here
+                has_work_1 = bool(work_address_1.strip())
+                has_work_2 = bool(work_address_2.strip())
+                work1_quoted = _quote_address(work_address_1) if has_work_1 else None
+                work2_quoted = _quote_address(work_address_2) if has_work_2 else None
+
+                # One pass over the results: collect diagnostics and debug payloads
+                # instead of pushing widgets per URL, then render them in one go
+                log_rows = []
+                debug_payloads = {}
+
+                for url, property_data in zip(urls, properties_data):
+                    debug_payloads[url] = property_data.pop('_debug', None)
+                    log_rows.append({
+                        'url': url,
+                        'status': property_data['status'],
+                        'address': '✅' if property_data['address'] else '⚠️ missing',
+                        'price': '✅' if property_data['asking_price'] else '⚠️ missing',
+                        'area': '✅' if property_data['area_m2'] else '⚠️ missing',
+                        'energy label': '✅' if property_data['energy_label'] else '⚠️ missing',
+                    })
+
                     # Add commute URLs
-                    if property_data['address'] and work_address_1:
+                    if has_work_1 and property_data['address']:
                         property_data['commute_url_1'] = scraper.get_commute_time_url(
-                            property_data['address'], work_address_1
+                            property_data['address'], work1_quoted
                         )
-                    
-                    if property_data['address'] and work_address_2:
+
+                    if has_work_2 and property_data['address']:
                         property_data['commute_url_2'] = scraper.get_commute_time_url(
-                            property_data['address'], work_address_2
+                            property_data['address'], work2_quoted
                         )
                     
-                    properties_data.append(property_data)
-                    time.sleep(1)  # Be respectful to the server
-                
                 # Create DataFrame
                 df = pd.DataFrame(properties_data)
                 
                 # Reorder columns
                 base_columns = ['address', 'link', 'asking_price', 'area_m2', 'energy_label', 'status']
                 commute_columns = []
-                if work_address_1:
+                if has_work_1:
                     commute_columns.append('commute_url_1')
-                if work_address_2:
+                if has_work_2:
                     commute_columns.append('commute_url_2')
                 
                 df = df.reindex(columns=base_columns + commute_columns)
-                
+
+                # Numeric price computed once at store time; the metric on every
+                # rerun is then a plain mean over a numeric column
+                df['_price_numeric'] = (
+                    df['asking_price'].str.replace(_NON_DIGIT_RE, '', regex=True)
+                    .replace('', pd.NA)
+                    .astype('Float64')
+                )
+
+                # Arrow-backed dtypes: Streamlit ships tables over Arrow anyway,
+                # so this makes that transport zero-copy and stores the long
+                # repeated URL strings far more compactly than Python objects
+                df = df.convert_dtypes(dtype_backend='pyarrow')
+
                 # Store in session state
                 st.session_state.scraped_data = df
                 st.session_state.output_filename = output_filename
-                
+                st.session_state.debug_payloads = debug_payloads
+
                 progress_bar.progress(1.0)
                 status_text.text("✅ Scraping completed!")
                 st.success("🎉 Scraping completed successfully!")
+                st.dataframe(pd.DataFrame(log_rows), use_container_width=True)
     
     with col2:
         if st.button("📋 Example URLs", use_container_width=True):
@@ -486,12 +724,32 @@ def main():
             st.metric("Errors", errors)
         with col4:
             if successful > 0:
-                avg_price = df[df['asking_price'].notna()]['asking_price'].str.extract(r'(\d+)').astype(float).mean().iloc[0]
-                st.metric("Avg Price (k€)", f"{avg_price:.0f}")
+                avg_price_k = (df['_price_numeric'] / 1000).mean()
+                if pd.notna(avg_price_k):
+                    st.metric("Avg Price (k€)", f"{avg_price_k:.0f}")
         
-        # Display data table
+        # Display data table (internal underscore columns stay hidden)
         st.subheader("Property Details")
-        st.dataframe(df, use_container_width=True)
+        st.dataframe(df.drop(columns=[col for col in df.columns if col.startswith('_')]),
+                     use_container_width=True)
+
+        # Debug inspector: render the payload for one selected URL only,
+        # instead of one expander per scraped property
+        debug_payloads = st.session_state.get('debug_payloads', {})
+        if st.session_state.get('debug_mode', False) and any(debug_payloads.values()):
+            st.subheader("🐛 Debug Inspector")
+            selected_url = st.selectbox("Inspect scraped page:", list(debug_payloads.keys()))
+            debug_info = debug_payloads.get(selected_url)
+            if debug_info:
+                if debug_info['title']:
+                    st.write(f"**Page Title:** {debug_info['title']}")
+                if debug_info['h1_elements']:
+                    st.write("**H1 elements found:**")
+                    for j, h1_text in enumerate(debug_info['h1_elements']):
+                        st.write(f"{j+1}. {h1_text}")
+                st.text_area("Raw text (first 2000 chars):", debug_info['text_snippet'], height=200)
+            else:
+                st.info("No debug info captured (the fetch failed before parsing)")
         
         # Manual data entry for blocked properties
         if 'scraped_data' in st.session_state:
@@ -573,19 +831,24 @@ def main():
         
         # Update DataFrame with commute times and create download
         if st.button("💾 Prepare Download", type="secondary"):
-            # Add manually entered commute times to DataFrame
-            for index, row in df.iterrows():
-                if f"commute1_{index}" in st.session_state:
-                    df.at[index, 'commute_time_1'] = st.session_state[f"commute1_{index}"]
-                if f"commute2_{index}" in st.session_state:
-                    df.at[index, 'commute_time_2'] = st.session_state[f"commute2_{index}"]
+            # Add manually entered commute times as whole-column assignments
+            # instead of iterrows + per-cell .at writes
+            if any(f"commute1_{index}" in st.session_state for index in df.index):
+                df['commute_time_1'] = [st.session_state.get(f"commute1_{index}", '') for index in df.index]
+            if any(f"commute2_{index}" in st.session_state for index in df.index):
+                df['commute_time_2'] = [st.session_state.get(f"commute2_{index}", '') for index in df.index]
             
-            # Remove URL columns for cleaner export
-            export_df = df.drop(columns=[col for col in df.columns if col.startswith('commute_url')])
+            # Remove URL and internal columns for cleaner export
+            export_df = df.drop(columns=[col for col in df.columns
+                                         if col.startswith('commute_url') or col.startswith('_')])
             
-            # Create download link
-            download_link = create_download_link(export_df, st.session_state.output_filename)
-            st.markdown(download_link, unsafe_allow_html=True)
+            # Serve the bytes directly; no base64 data-URL inflation
+            st.download_button(
+                label="📥 Download Excel File",
+                data=create_excel_bytes(export_df),
+                file_name=st.session_state.output_filename,
+                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            )
             st.success("📁 File prepared for download!")
     
     # Footer